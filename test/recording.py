@@ -0,0 +1,60 @@
+import thread
+import threading
+
+from transactional.transactional_middleware import BaseTransactionMiddleware
+
+class RecordingTransactionMiddleware(BaseTransactionMiddleware):
+    """
+    Counts performed, rolled back and compensated actions and remembers every
+    action that was handled by a different thread than the one that recorded
+    it. Actions are ``(thread_id, request_id, level)`` tuples as recorded by
+    the load test views; performing one registers itself as its compensation.
+    """
+    lock = threading.Lock()
+    performed = 0
+    rolled_back = 0
+    compensated = 0
+    leaks = list()
+
+    @classmethod
+    def reset(cls):
+        cls.lock.acquire()
+        try:
+            cls.performed = 0
+            cls.rolled_back = 0
+            cls.compensated = 0
+            cls.leaks = list()
+        finally:
+            cls.lock.release()
+
+    def check_action(self, action):
+        if action[0] != thread.get_ident():
+            self.leaks.append(action)
+
+    def perform_action(self, action):
+        cls = type(self)
+        cls.lock.acquire()
+        try:
+            cls.performed += 1
+            self.check_action(action)
+        finally:
+            cls.lock.release()
+        return action
+
+    def rollback_action(self, action):
+        cls = type(self)
+        cls.lock.acquire()
+        try:
+            cls.rolled_back += 1
+            self.check_action(action)
+        finally:
+            cls.lock.release()
+
+    def compensate_action(self, compensation):
+        cls = type(self)
+        cls.lock.acquire()
+        try:
+            cls.compensated += 1
+            self.check_action(compensation)
+        finally:
+            cls.lock.release()
@@ -86,6 +86,11 @@ INSTALLED_APPS = (
     'transactional',
 )
 
+TRANSACTIONAL_MIDDLEWARE = (
+    'transactional.transactional_middleware.DatabaseTransactionMiddleware',
+    'recording.RecordingTransactionMiddleware',
+)
+
 
 try:
     from localsettings import *
@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+"""
+Measures the latency of the first transaction in freshly started threads in
+three modes:
+
+baseline
+    every thread builds its own ``TransactionalManager()`` and middleware
+    instances, as ``TransactionalManagerContext`` used to do;
+cold
+    threads share the process wide manager, built by the first of them;
+warm
+    the process wide manager is built by ``warm_up()`` before the threads
+    start.
+
+The middleware modules are imported before any measurement, so none of the
+modes includes module import time; they only differ in resolving the
+configuration and building the manager. Run it from this directory::
+
+    python startup_benchmark.py --threads 32
+"""
+import sys
+import thread
+import threading
+import time
+from optparse import OptionParser
+
+sys.path.append('../')
+from django.core.management import setup_environ
+import settings
+setup_environ(settings)
+
+from transactional import handler
+from transactional import settings as transactional_settings
+from transactional.common import transactional_manager
+from transactional.handler import TransactionalManager, TransactionalManagerContext
+
+from views import RECORDER
+
+def per_thread_manager():
+    managers = TransactionalManagerContext.get_or_init()
+    try:
+        return managers.top()
+    except IndexError:
+        # Resolve the middleware classes again, as every thread used to.
+        handler._middleware_classes.clear()
+        manager = TransactionalManager()
+        manager.activate_context()
+        return manager
+
+def run_transaction(get_manager):
+    manager = get_manager()
+    manager.enter(True)
+    try:
+        manager.record_action(RECORDER, (thread.get_ident(), 'startup', 0))
+        manager.commit()
+    finally:
+        manager.leave()
+
+def measure(count, requests, get_manager=transactional_manager):
+    """
+    Starts ``count`` threads at once and returns the latency of the first
+    transaction of each thread and of the ones that follow it.
+    """
+    lock = threading.Lock()
+    start_event = threading.Event()
+    first = list()
+    later = list()
+
+    def worker():
+        start_event.wait()
+        timings = list()
+        for index in range(requests):
+            start = time.time()
+            run_transaction(get_manager)
+            timings.append(time.time() - start)
+        lock.acquire()
+        try:
+            first.append(timings[0])
+            later.extend(timings[1:])
+        finally:
+            lock.release()
+
+    workers = [threading.Thread(target=worker) for index in range(count)]
+    for worker_thread in workers:
+        worker_thread.start()
+    start_event.set()
+    for worker_thread in workers:
+        worker_thread.join()
+    return first, later
+
+def reset():
+    # Forget the process wide manager so the next measurement starts cold.
+    handler._default_manager = None
+    handler._middleware_classes.clear()
+
+def report(label, first, later):
+    first = sorted(first)
+    print '%s first request: mean %.3fms, max %.3fms' % (label, sum(first) / len(first) * 1000, first[-1] * 1000)
+    if later:
+        print '%s later requests: mean %.3fms' % (label, sum(later) / len(later) * 1000)
+
+def main():
+    parser = OptionParser(usage='%prog [options]')
+    parser.add_option('-t', '--threads', type='int', default=32,
+                      help='number of threads started at once')
+    parser.add_option('-n', '--requests', type='int', default=10,
+                      help='number of transactions per thread')
+    options, args = parser.parse_args()
+
+    for middleware_path in transactional_settings.TRANSACTIONAL_MIDDLEWARE:
+        if isinstance(middleware_path, (tuple, list)):
+            middleware_path = middleware_path[0]
+        handler.load_middleware_class(middleware_path)
+
+    reset()
+    report('baseline', *measure(options.threads, options.requests, per_thread_manager))
+
+    reset()
+    report('cold', *measure(options.threads, options.requests))
+
+    reset()
+    start = time.time()
+    handler.warm_up()
+    print 'warm up: %.3fms' % ((time.time() - start) * 1000)
+    report('warm', *measure(options.threads, options.requests))
+
+if __name__ == '__main__':
+    main()
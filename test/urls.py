@@ -1,5 +1,6 @@
 from django.conf.urls.defaults import *
 
 urlpatterns = patterns('',
-    
+    (r'^load/commit/$', 'views.commit_view'),
+    (r'^load/rollback/$', 'views.rollback_view'),
 )
@@ -0,0 +1,62 @@
+import thread
+
+from django.db import connection
+from django.http import HttpResponse
+
+from transactional.common import transactional_manager
+
+RECORDER = 'recording.RecordingTransactionMiddleware'
+
+TABLE = 'loadtest_entry'
+
+def create_table():
+    cursor = connection.cursor()
+    cursor.execute('CREATE TABLE IF NOT EXISTS %s (id INTEGER PRIMARY KEY, request VARCHAR(64), level INTEGER)' % TABLE)
+
+def insert_entry(request_id, level):
+    cursor = connection.cursor()
+    cursor.execute('INSERT INTO %s (request, level) VALUES (%%s, %%s)' % TABLE, [request_id, level])
+
+def run_transaction(request, commit):
+    """
+    Records an action and inserts a row on every savepoint level, rolls back
+    the innermost savepoint, commits the others and then commits or rolls
+    back the whole transaction. The response body is the number of actions
+    and compensations that were already pending in the session when the
+    request started, which must always be zero.
+    """
+    request_id = request.GET.get('id', '')
+    depth = int(request.GET.get('depth', 3))
+    thread_id = thread.get_ident()
+    manager = transactional_manager()
+    manager.enter(True)
+    try:
+        session = manager.middleware[RECORDER].session
+        stale = len(session.actions) + len(session.undo_log)
+        manager.record_action(RECORDER, (thread_id, request_id, 0))
+        insert_entry(request_id, 0)
+        savepoints = list()
+        for level in range(1, depth + 1):
+            savepoints.append(manager.savepoint_enter())
+            manager.record_action(RECORDER, (thread_id, request_id, level))
+            insert_entry(request_id, level)
+        if savepoints:
+            manager.savepoint_rollback(savepoints.pop())
+        while savepoints:
+            manager.savepoint_commit(savepoints.pop())
+        if commit:
+            manager.commit()
+        else:
+            manager.rollback()
+    except:
+        manager.rollback()
+        raise
+    finally:
+        manager.leave()
+    return HttpResponse(str(stale), mimetype='text/plain')
+
+def commit_view(request):
+    return run_transaction(request, commit=True)
+
+def rollback_view(request):
+    return run_transaction(request, commit=False)
@@ -6,6 +6,7 @@ from django.utils.importlib import import_module
 from django.utils.datastructures import SortedDict
 
 import settings
+from tracing import get_default_tracer
 
 class TrackableStack(object):
     def __init__(self):
@@ -46,7 +47,7 @@ class TransactionalManagerContext(object):
         try:
             return managers.top()
         except IndexError:
-            transactional_manager = TransactionalManager()
+            transactional_manager = get_default_manager()
             transactional_manager.activate_context()
             return transactional_manager
 
@@ -58,6 +59,33 @@ class SavePoint(dict):
     def __hash__(self):
         return self['_id']
 
+_middleware_classes = dict()
+
+def load_middleware_class(middleware_path):
+    """
+    Imports and returns the middleware class (or object) for a dotted path.
+    Lookups are cached for the lifetime of the process.
+    """
+    try:
+        return _middleware_classes[middleware_path]
+    except KeyError:
+        pass
+    try:
+        dot = middleware_path.rindex('.')
+    except ValueError:
+        raise exceptions.ImproperlyConfigured('%s isn\'t a middleware module' % middleware_path)
+    mw_module, mw_classname = middleware_path[:dot], middleware_path[dot+1:]
+    try:
+        mod = import_module(mw_module)
+    except ImportError, e:
+        raise exceptions.ImproperlyConfigured('Error importing middleware %s: "%s"' % (mw_module, e))
+    try:
+        mw_class = getattr(mod, mw_classname)
+    except AttributeError:
+        raise exceptions.ImproperlyConfigured('Middleware module "%s" does not define a "%s" class' % (mw_module, mw_classname))
+    _middleware_classes[middleware_path] = mw_class
+    return mw_class
+
 def initialize_middleware(paths=None):
     middlewares = SortedDict()
     if paths is None:
@@ -66,20 +94,11 @@ def initialize_middleware(paths=None):
         kwargs = {}
         args = []
         if isinstance(middleware_path, (tuple, list)):
-            middleware_path, args, kwargs = middleware_path
-        try:
-            dot = middleware_path.rindex('.')
-        except ValueError:
-            raise exceptions.ImproperlyConfigured('%s isn\'t a middleware module' % middleware_path)
-        mw_module, mw_classname = middleware_path[:dot], middleware_path[dot+1:]
-        try:
-            mod = import_module(mw_module)
-        except ImportError, e:
-            raise exceptions.ImproperlyConfigured('Error importing middleware %s: "%s"' % (mw_module, e))
-        try:
-            mw_class = getattr(mod, mw_classname)
-        except AttributeError:
-            raise exceptions.ImproperlyConfigured('Middleware module "%s" does not define a "%s" class' % (mw_module, mw_classname))
+            try:
+                middleware_path, args, kwargs = middleware_path
+            except ValueError:
+                raise exceptions.ImproperlyConfigured('%r should be a (path, args, kwargs) triple' % (middleware_path,))
+        mw_class = load_middleware_class(middleware_path)
 
         if callable(mw_class):
             try:
@@ -92,18 +111,29 @@ def initialize_middleware(paths=None):
     return middlewares
 
 class TransactionalManager(object):
-    def __init__(self, paths=None):
+    def __init__(self, paths=None, tracer=None):
         self.middleware = initialize_middleware(paths)
         self.local = threading.local()
+        if tracer is None:
+            tracer = get_default_tracer()
+        self.tracer = tracer
+        # built once so that dispatching a hook doesn't allocate span args
+        self.span_args = dict((path, {'middleware': path}) for path in self.middleware)
         
         for middleware in self.middleware.itervalues():
             if hasattr(middleware, 'set_handler'):
                 middleware.set_handler(self)
     
     def _proxy_call(self, attr, *args, **kwargs):
-        for middleware in self.middleware.itervalues():
+        tracer = self.tracer
+        if tracer is None:
+            for middleware in self.middleware.itervalues():
+                if hasattr(middleware, attr):
+                    getattr(middleware, attr)(*args, **kwargs)
+            return
+        for path, middleware in self.middleware.iteritems():
             if hasattr(middleware, attr):
-                getattr(middleware, attr)(*args, **kwargs)
+                tracer.call(attr, 'hook', self.span_args[path], getattr(middleware, attr), *args, **kwargs)
     
     def activate_context(self):
         TransactionalManagerContext.activate_context(self)
@@ -115,11 +145,24 @@ class TransactionalManager(object):
         return getattr(self.local, 'savepoints', None)
     
     def enter(self, flag=False):
-        self._proxy_call('enter')
-        self.managed(flag)
+        if self.tracer is None:
+            self._proxy_call('enter')
+            self.managed(flag)
+            return
+        self.tracer.begin()
+        try:
+            self._proxy_call('enter')
+            self.managed(flag)
+        except:
+            self.tracer.end()
+            raise
     
     def leave(self):
-        self._proxy_call('leave')
+        try:
+            self._proxy_call('leave')
+        finally:
+            if self.tracer is not None:
+                self.tracer.end()
     
     def commit(self):
         self._proxy_call('commit')
@@ -173,7 +216,10 @@ class TransactionalManager(object):
     def record_action(self, path, action):
         if path not in self.middleware:
             return False
-        self.middleware[path].record_action(action)
+        if self.tracer is None:
+            self.middleware[path].record_action(action)
+        else:
+            self.tracer.call('record_action', 'hook', self.span_args[path], self.middleware[path].record_action, action)
         return True
     
     def __del__(self):
@@ -182,3 +228,30 @@ class TransactionalManager(object):
         except:
             pass
 
+_default_manager = None
+_default_manager_lock = threading.Lock()
+
+def get_default_manager():
+    """
+    Returns the process wide manager for ``TRANSACTIONAL_MIDDLEWARE``. The
+    middleware instances are built once and shared by every thread; all per
+    thread state lives in the thread locals of the manager and middlewares.
+    """
+    global _default_manager
+    if _default_manager is None:
+        _default_manager_lock.acquire()
+        try:
+            if _default_manager is None:
+                _default_manager = TransactionalManager()
+        finally:
+            _default_manager_lock.release()
+    return _default_manager
+
+def warm_up():
+    """
+    Resolves and validates ``TRANSACTIONAL_MIDDLEWARE`` ahead of the first
+    request, raising ``ImproperlyConfigured`` for a broken configuration.
+    Call it at startup (before forking) so that workers share the result.
+    """
+    return get_default_manager()
+
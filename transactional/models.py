@@ -0,0 +1,7 @@
+import settings
+from handler import warm_up
+
+# models is imported when Django loads the installed apps, which makes it the
+# earliest point at which the middleware configuration can be resolved.
+if settings.TRANSACTIONAL_WARM_UP:
+    warm_up()
@@ -1,7 +1,8 @@
 class TransactionSavePoint(object):
-    def __init__(self, session, parent=None, info=None, index=0):
+    def __init__(self, session, parent=None, info=None, index=0, undo_index=0):
         self.session = session
         self.index = index
+        self.undo_index = undo_index
         self.child = None
         self.parent = parent
         self.info = info
@@ -26,10 +27,13 @@ class TransactionSession(object):
         self.save_point_class = save_point_class
         self.root_save_point = self.save_point_class(session=self, info=None)
         self.actions = list()
+        self.undo_log = list()
+        self.depth = 0
     
     def add_save_point(self, info=None):
         tail = self.root_save_point.tail()
-        child = self.save_point_class(session=self, parent=tail, info=info, index=len(self.actions))
+        child = self.save_point_class(session=self, parent=tail, info=info, index=len(self.actions),
+                                      undo_index=len(self.undo_log))
         tail.child = child
         return child
     
@@ -49,3 +53,21 @@ class TransactionSession(object):
     
     def record_action(self, action):
         self.actions.append(action)
+    
+    def record_compensation(self, compensation):
+        self.undo_log.append(compensation)
+    
+    def pop_compensations(self, info=None):
+        """
+        Removes and returns the compensations registered since the given save
+        point was added (or all of them), most recent first. Must be called
+        before the save point itself is popped.
+        """
+        if info is None:
+            index = 0
+        else:
+            index = self.root_save_point.find_save_point(info).undo_index
+        compensations = self.undo_log[index:]
+        self.undo_log = self.undo_log[:index]
+        compensations.reverse()
+        return compensations
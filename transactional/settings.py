@@ -2,5 +2,11 @@ from django.conf import settings
 
 TRANSACTIONAL_MIDDLEWARE = getattr(settings, 'TRANSACTIONAL_MIDDLEWARE', [])
 
+TRANSACTIONAL_WARM_UP = getattr(settings, 'TRANSACTIONAL_WARM_UP', False)
+
+TRANSACTIONAL_TRACING = getattr(settings, 'TRANSACTIONAL_TRACING', False)
+
+TRANSACTIONAL_TRACE_SAMPLE_RATE = getattr(settings, 'TRANSACTIONAL_TRACE_SAMPLE_RATE', 1.0)
+
 
 
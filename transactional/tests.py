@@ -1,8 +1,14 @@
 import logging
+import threading
 
+from django.core.exceptions import ImproperlyConfigured
 from django.test import TestCase
 
-from handler import TransactionalManager
+import handler
+import models
+import settings
+from handler import TransactionalManager, TransactionalManagerContext, get_default_manager, initialize_middleware, warm_up
+from tracing import TransactionTracer
 
 class DummyHandler(logging.Handler):
     def __init__(self):
@@ -82,4 +88,236 @@ class TransactionalTest(TestCase):
         
         self.transactional_manager.leave()
         self.transactional_manager.deactivate_context()
+    
+    def test_undo_log(self):
+        self.transactional_manager.enter()
+        self.transactional_manager.managed(True)
+        
+        self.record_action('level 1')
+        outer = self.transactional_manager.savepoint_enter()
+        self.record_action('level 2')
+        inner = self.transactional_manager.savepoint_enter()
+        self.record_action('level 3')
+        self.transactional_manager.savepoint_commit(inner)
+        self.record_action('level 2b')
+        self.transactional_manager.savepoint_commit(outer)
+        self.assert_log('Performed: level 2', 'Performed: level 3', 'Performed: level 2b')
+        
+        sp = self.transactional_manager.savepoint_enter()
+        self.record_action('level 4')
+        inner = self.transactional_manager.savepoint_enter()
+        self.record_action('level 5')
+        self.transactional_manager.savepoint_commit(inner)
+        self.assert_log('Performed: level 5')
+        self.transactional_manager.savepoint_rollback(sp)
+        self.assert_not_log('Compensated: level 2')
+        self.assert_log('Rollbacked: level 4', 'Compensated: level 5')
+        
+        self.transactional_manager.rollback()
+        messages = self.handler.messages
+        self.assert_log('Rollbacked: level 1', 'Compensated: level 2', 'Compensated: level 3', 'Compensated: level 2b')
+        compensated = [message for message in messages if message.startswith('Compensated')]
+        self.assertEqual(['Compensated: level 2b', 'Compensated: level 2', 'Compensated: level 3'], compensated)
+        self.assertEqual(0, len(self.transactional_manager.middleware['transactional.transactional_middleware.LoggingTransactionMiddleware'].session.undo_log))
+        
+        self.transactional_manager.managed(False)
+        self.record_action('autocommit')
+        self.assert_log('Performed: autocommit')
+        self.transactional_manager.rollback()
+        self.assert_log('Compensated: autocommit')
+        
+        self.transactional_manager.leave()
+    
+    def test_compensation_batches(self):
+        middleware = self.transactional_manager.middleware['transactional.transactional_middleware.LoggingTransactionMiddleware']
+        batches = list()
+        middleware.compensation_batch_size = 2
+        middleware.compensate_actions = lambda compensations: batches.append(compensations)
+        self.transactional_manager.enter()
+        self.transactional_manager.managed(True)
+        for index in range(5):
+            sp = self.transactional_manager.savepoint_enter()
+            self.record_action(index)
+            self.transactional_manager.savepoint_commit(sp)
+        self.transactional_manager.rollback()
+        self.assertEqual([[4, 3], [2, 1], [0]], batches)
+        self.transactional_manager.leave()
+        
+        batches = list()
+        middleware.compensation_batch_size = 0
+        self.transactional_manager.enter()
+        self.transactional_manager.managed(True)
+        for index in range(3):
+            sp = self.transactional_manager.savepoint_enter()
+            self.record_action(index)
+            self.transactional_manager.savepoint_commit(sp)
+        self.transactional_manager.rollback()
+        self.assertEqual([[2, 1, 0]], batches)
+        self.transactional_manager.leave()
+    
+    def test_failing_compensation_batch(self):
+        middleware = self.transactional_manager.middleware['transactional.transactional_middleware.LoggingTransactionMiddleware']
+        batches = list()
+        
+        def compensate_actions(compensations):
+            batches.append(compensations)
+            if len(batches) == 1:
+                raise ValueError('compensation failed')
+        
+        middleware.compensation_batch_size = 1
+        middleware.compensate_actions = compensate_actions
+        self.transactional_manager.enter()
+        self.transactional_manager.managed(True)
+        for index in range(3):
+            sp = self.transactional_manager.savepoint_enter()
+            self.record_action(index)
+            self.transactional_manager.savepoint_commit(sp)
+        self.assertRaises(ValueError, self.transactional_manager.rollback)
+        self.assertEqual([[2], [1], [0]], batches)
+        self.transactional_manager.leave()
+    
+    def test_undo_log_discarded_on_leave(self):
+        middleware = self.transactional_manager.middleware['transactional.transactional_middleware.LoggingTransactionMiddleware']
+        self.transactional_manager.enter()
+        self.record_action('previous block')
+        self.assert_log('Performed: previous block')
+        self.transactional_manager.leave()
+        self.assertEqual(0, len(middleware.session.undo_log))
+        
+        self.transactional_manager.enter(True)
+        self.record_action('current block')
+        self.transactional_manager.rollback()
+        self.assert_not_log('Compensated: previous block')
+        self.assert_log('Rollbacked: current block')
+        self.transactional_manager.leave()
+
+
+class FailingEnterMiddleware(object):
+    def enter(self):
+        raise ValueError('enter failed')
 
+class TransactionTracerTest(TestCase):
+    def setUp(self):
+        self.tracer = TransactionTracer()
+        self.transactional_manager = TransactionalManager(['transactional.transactional_middleware.LoggingTransactionMiddleware'],
+                                                          tracer=self.tracer)
+        self.path = 'transactional.transactional_middleware.LoggingTransactionMiddleware'
+    
+    def test_trace_export(self):
+        self.transactional_manager.enter(True)
+        self.transactional_manager.record_action(self.path, 'level 1')
+        sp = self.transactional_manager.savepoint_enter()
+        self.transactional_manager.record_action(self.path, 'level 2')
+        self.transactional_manager.savepoint_commit(sp)
+        self.transactional_manager.commit()
+        self.transactional_manager.leave()
+        
+        events = self.tracer.export()['traceEvents']
+        names = [event['name'] for event in events]
+        self.assertEqual(['enter', 'managed', 'record_action', 'savepoint_enter', 'record_action',
+                          'perform_action', 'savepoint_commit', 'perform_action', 'commit', 'leave'], names)
+        for event in events:
+            self.assertEqual('X', event['ph'])
+            self.assertEqual(0, event['args']['request'])
+            self.assertTrue(event['dur'] >= 0)
+        self.assertEqual(['hook', 'action'], [event['cat'] for event in events[4:6]])
+    
+    def test_sampling(self):
+        self.tracer.sample_rate = 0
+        self.transactional_manager.enter(True)
+        self.transactional_manager.commit()
+        self.transactional_manager.leave()
+        self.assertEqual([], self.tracer.export()['traceEvents'])
+    
+    def test_ring_buffer(self):
+        self.tracer.buffer_size = 4
+        self.transactional_manager.enter(True)
+        for index in range(10):
+            self.transactional_manager.record_action(self.path, index)
+        self.transactional_manager.commit()
+        self.transactional_manager.leave()
+        events = self.tracer.export()['traceEvents']
+        self.assertEqual(4, len(events))
+        self.assertEqual('leave', events[-1]['name'])
+    
+    def test_failing_enter(self):
+        manager = TransactionalManager(['transactional.tests.FailingEnterMiddleware', self.path], tracer=self.tracer)
+        self.assertRaises(ValueError, manager.enter, True)
+        self.assertEqual(0, getattr(self.tracer.local, 'depth', 0))
+        
+        self.transactional_manager.enter(True)
+        self.transactional_manager.commit()
+        self.transactional_manager.leave()
+        self.assertEqual(2, len(self.tracer.traces))
+        self.assertEqual('commit', self.tracer.traces[-1].spans[-2][0])
+    
+    def test_unsampled_requests_skip_span_args(self):
+        class Action(object):
+            def __str__(self):
+                return 'action'
+            
+            def __repr__(self):
+                raise AssertionError('span args built for an unsampled request')
+        
+        self.tracer.sample_rate = 0
+        self.transactional_manager.enter(False)
+        self.transactional_manager.record_action(self.path, Action())
+        self.transactional_manager.leave()
+
+class SharedManagerTest(TestCase):
+    path = 'transactional.transactional_middleware.LoggingTransactionMiddleware'
+    
+    def run_threads(self, target, count=4):
+        threads = [threading.Thread(target=target, args=(index,)) for index in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    
+    def test_default_manager_is_shared(self):
+        managers = list()
+        self.run_threads(lambda index: managers.append(TransactionalManagerContext.get_active_context()))
+        self.assertEqual(4, len(managers))
+        for manager in managers:
+            self.assertTrue(manager is get_default_manager())
+    
+    def test_thread_state_is_separate(self):
+        manager = TransactionalManager([self.path])
+        middleware = manager.middleware[self.path]
+        sessions = dict()
+        
+        def run(index):
+            manager.enter(True)
+            manager.record_action(self.path, index)
+            sessions[index] = (manager.is_managed(), list(middleware.session.actions))
+            manager.rollback()
+            manager.leave()
+        
+        self.run_threads(run)
+        for index in range(4):
+            self.assertEqual((True, [index]), sessions[index])
+    
+    def test_invalid_configuration(self):
+        self.assertRaises(ImproperlyConfigured, initialize_middleware, ['nodots'])
+        self.assertRaises(ImproperlyConfigured, initialize_middleware, [(self.path, [])])
+        self.assertRaises(ImproperlyConfigured, initialize_middleware, ['transactional.transactional_middleware.Missing'])
+
+class WarmUpTest(TestCase):
+    def setUp(self):
+        self.saved = (handler._default_manager, settings.TRANSACTIONAL_MIDDLEWARE, settings.TRANSACTIONAL_WARM_UP)
+        handler._default_manager = None
+        settings.TRANSACTIONAL_MIDDLEWARE = ['transactional.transactional_middleware.Missing']
+    
+    def tearDown(self):
+        handler._default_manager, settings.TRANSACTIONAL_MIDDLEWARE, settings.TRANSACTIONAL_WARM_UP = self.saved
+    
+    def test_warm_up_validates_configuration(self):
+        self.assertRaises(ImproperlyConfigured, warm_up)
+        self.assertTrue(handler._default_manager is None)
+    
+    def test_models_hook(self):
+        settings.TRANSACTIONAL_WARM_UP = False
+        reload(models)
+        self.assertTrue(handler._default_manager is None)
+        settings.TRANSACTIONAL_WARM_UP = True
+        self.assertRaises(ImproperlyConfigured, reload, models)
@@ -0,0 +1,150 @@
+import os
+import random
+import threading
+import time
+from collections import deque
+
+try:
+    import json
+except ImportError:
+    from django.utils import simplejson as json  # Python 2.5 fallback.
+
+import settings
+
+class TransactionTrace(object):
+    """
+    The spans recorded for a single request (the outermost enter/leave pair)
+    in one thread.
+    """
+    def __init__(self, thread_id, buffer_size):
+        self.thread_id = thread_id
+        self.spans = deque(maxlen=buffer_size)
+
+class TransactionTracer(object):
+    """
+    Records timestamped spans for every hook the ``TransactionalManager``
+    dispatches and every action a middleware performs, rolls back or
+    compensates. Spans go into a bounded ring buffer per thread, so a request
+    that produces more spans than ``buffer_size`` keeps only the most recent
+    ones. Only a ``sample_rate`` fraction of requests is traced; the others
+    cost a single thread local lookup per span. The last ``max_traces``
+    sampled requests are kept and can be exported in the Chrome trace event
+    format.
+    """
+    def __init__(self, sample_rate=1.0, buffer_size=1024, max_traces=100):
+        self.sample_rate = sample_rate
+        self.buffer_size = buffer_size
+        self.local = threading.local()
+        self.traces = deque(maxlen=max_traces)
+        self.lock = threading.Lock()
+
+    @property
+    def trace(self):
+        return getattr(self.local, 'trace', None)
+
+    def begin(self):
+        """Marks the start of a request, deciding whether it is sampled."""
+        depth = getattr(self.local, 'depth', 0)
+        self.local.depth = depth + 1
+        if depth:
+            return
+        if self.sample_rate >= 1 or random.random() < self.sample_rate:
+            self.local.trace = TransactionTrace(threading.currentThread().ident, self.buffer_size)
+        else:
+            self.local.trace = None
+
+    def end(self):
+        """Marks the end of a request and keeps its trace if it was sampled."""
+        depth = getattr(self.local, 'depth', 0) - 1
+        if depth < 0:
+            return
+        self.local.depth = depth
+        if depth:
+            return
+        trace = self.trace
+        self.local.trace = None
+        if trace is not None and trace.spans:
+            self.lock.acquire()
+            try:
+                self.traces.append(trace)
+            finally:
+                self.lock.release()
+
+    def start_span(self):
+        """
+        Returns the start timestamp for a span, or None if the current request
+        is not sampled.
+        """
+        if self.trace is None:
+            return None
+        return time.time()
+
+    def end_span(self, name, category, start, args=None):
+        if start is None:
+            return
+        trace = self.trace
+        if trace is None:
+            return
+        trace.spans.append((name, category, start, time.time() - start, args))
+
+    def call(self, name, category, args, func, *func_args, **func_kwargs):
+        """
+        Calls ``func`` and records a span for it, returning its result.
+        """
+        if self.trace is None:
+            return func(*func_args, **func_kwargs)
+        start = self.start_span()
+        try:
+            return func(*func_args, **func_kwargs)
+        finally:
+            self.end_span(name, category, start, args)
+
+    def clear(self):
+        self.lock.acquire()
+        try:
+            self.traces.clear()
+        finally:
+            self.lock.release()
+
+    def export(self):
+        """
+        Returns the sampled requests as a Chrome trace event document, one
+        complete ("X") event per span with timestamps in microseconds.
+        """
+        self.lock.acquire()
+        try:
+            traces = list(self.traces)
+        finally:
+            self.lock.release()
+        pid = os.getpid()
+        events = list()
+        for request_index, trace in enumerate(traces):
+            for name, category, start, duration, args in trace.spans:
+                event_args = {'request': request_index}
+                if args:
+                    event_args.update(args)
+                events.append({'name': name,
+                               'cat': category,
+                               'ph': 'X',
+                               'ts': int(start * 1000000),
+                               'dur': int(duration * 1000000),
+                               'pid': pid,
+                               'tid': trace.thread_id,
+                               'args': event_args})
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def dump(self, fp):
+        json.dump(self.export(), fp)
+
+_default_tracer = None
+
+def get_default_tracer():
+    """
+    Returns the process wide tracer if ``TRANSACTIONAL_TRACING`` is enabled.
+    """
+    global _default_tracer
+    if not settings.TRANSACTIONAL_TRACING:
+        return None
+    if _default_tracer is None:
+        _default_tracer = TransactionTracer(sample_rate=settings.TRANSACTIONAL_TRACE_SAMPLE_RATE)
+    return _default_tracer
@@ -1,4 +1,5 @@
 import logging
+import sys
 import threading
 from django.db import transaction as db_transaction
 
@@ -38,6 +39,7 @@ class DatabaseTransactionMiddleware(object):
 
 class BaseTransactionMiddleware(object):
     local = threading.local() #uses a shared context within the thread
+    compensation_batch_size = 100
     
     def set_handler(self, handler):
         self.handler = handler
@@ -49,17 +51,26 @@ class BaseTransactionMiddleware(object):
     def enter(self):
         if not self.session:
             self.local.session = TransactionSession()
+        self.session.depth += 1
     
     def leave(self):
-        pass
+        if not self.session or not self.session.depth:
+            return
+        self.session.depth -= 1
+        if not self.session.depth:
+            # nothing outside the block can roll back what was performed in it
+            self.session.pop_compensations()
     
     def commit(self):
+        self.session.pop_compensations()
         for action in self.session.pop_save_point():
-            self.perform_action(action)
+            self.dispatch_action(self.perform_action, action)
     
     def rollback(self):
+        compensations = self.session.pop_compensations()
         for action in self.session.pop_save_point():
-            self.rollback_action(action)
+            self.dispatch_action(self.rollback_action, action)
+        self.compensate(compensations)
     
     def managed(self, flag):
         self.local._managed = flag
@@ -71,27 +82,82 @@ class BaseTransactionMiddleware(object):
         self.session.add_save_point(savepoint)
     
     def savepoint_rollback(self, savepoint):
+        compensations = self.session.pop_compensations(savepoint)
         for action in self.session.pop_save_point(savepoint):
-            self.rollback_action(action)
+            self.dispatch_action(self.rollback_action, action)
+        self.compensate(compensations)
     
     def savepoint_commit(self, savepoint):
         for action in self.session.pop_save_point(savepoint):
-            self.perform_action(action)
+            self.perform_early(action)
     
     def get_active_save_point(self):
         return self.session.tail()
     
+    def dispatch_action(self, method, action):
+        """
+        Calls ``method`` with ``action``, recording a span for it when the
+        handler has a tracer.
+        """
+        tracer = getattr(getattr(self, 'handler', None), 'tracer', None)
+        if tracer is None or tracer.trace is None:
+            return method(action)
+        return tracer.call(method.__name__, 'action', {'action': repr(action)}, method, action)
+    
+    def perform_early(self, action):
+        """
+        Performs an action before the outer transaction is committed. A
+        compensation returned by ``perform_action`` is kept in the undo log so
+        that a later rollback of an enclosing save point or of the whole
+        transaction can undo it.
+        """
+        compensation = self.dispatch_action(self.perform_action, action)
+        if compensation is not None and self.session is not None and self.session.depth:
+            self.session.record_compensation(compensation)
+    
+    def compensate(self, compensations):
+        """
+        Applies compensations (already ordered most recent first) in batches
+        of ``compensation_batch_size``; a size below 1 applies them in a single
+        batch. A failing batch does not stop the remaining ones from being
+        applied; the first error is raised once all batches have run.
+        """
+        size = self.compensation_batch_size
+        if size < 1:
+            size = max(len(compensations), 1)
+        error = None
+        for start in range(0, len(compensations), size):
+            try:
+                self.dispatch_action(self.compensate_actions, compensations[start:start + size])
+            except:
+                if error is None:
+                    error = sys.exc_info()
+        if error is not None:
+            raise error[0], error[1], error[2]
+    
     def perform_action(self, action):
+        """
+        Performs an action. May return a compensation that undoes it, which is
+        applied by ``compensate_actions`` if the action was performed early and
+        the enclosing transaction is rolled back.
+        """
         pass
     
     def rollback_action(self, action):
         pass
     
+    def compensate_actions(self, compensations):
+        for compensation in compensations:
+            self.compensate_action(compensation)
+    
+    def compensate_action(self, compensation):
+        pass
+    
     def record_action(self, action):
         if self.is_managed():
             self.session.record_action(action)
         else:
-            self.perform_action(action)
+            self.perform_early(action)
 
 class LoggingTransactionMiddleware(BaseTransactionMiddleware):
     def __init__(self, logger=None):
@@ -134,7 +200,11 @@ class LoggingTransactionMiddleware(BaseTransactionMiddleware):
     
     def perform_action(self, action):
         self.logger.info('Performed: %s' % action)
+        return action
     
     def rollback_action(self, action):
         self.logger.info('Rollbacked: %s' % action)
+    
+    def compensate_action(self, compensation):
+        self.logger.info('Compensated: %s' % compensation)
 